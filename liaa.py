@@ -1,33 +1,75 @@
 import os
-import base64
 import string
 import random
-import hashlib
 import operator
 import time
 import asyncio
-import collections
+import bisect
+import functools
 import heapq
+import itertools
 import struct
 import json
-import umsgpack
+import logging
 import psutil
 from _typing import *
 
+# every serializer backend is bound to these same two signatures
+packb: Callable[[Any], bytes]
+unpackb: Callable[[Union[bytes, memoryview]], Any]
+
+try:
+    import msgspec
+
+    _ENCODER = msgspec.msgpack.Encoder()
+    _DECODER = msgspec.msgpack.Decoder()
+
+    packb = _ENCODER.encode
+    unpackb = _DECODER.decode
+
+except ImportError:
+    try:
+        import msgpack
+
+        _PACKER = msgpack.Packer(use_bin_type=True)
+
+        def _msgpack_packb(obj: Any) -> bytes:
+            b: bytes = _PACKER.pack(obj)
+            return b
+
+        def _msgpack_unpackb(b: Union[bytes, memoryview]) -> Any:
+            return msgpack.unpackb(b, raw=False)
+
+        packb, unpackb = _msgpack_packb, _msgpack_unpackb
+
+    except ImportError:
+        import umsgpack
+
+        def _umsgpack_unpackb(b: Union[bytes, memoryview]) -> Any:
+            # umsgpack only accepts bytes and bytearray
+            return umsgpack.unpackb(bytes(b))
+
+        packb, unpackb = umsgpack.packb, _umsgpack_unpackb
+
 
 BYTE_ORDER: str = "I"
 MAX_LONG: int = 2 ** 125
 KSIZE: int = 3
+LIMB_BITS: int = 64
+LIMB_MASK: int = 2 ** LIMB_BITS - 1
+REQUEST_HEADER: bytes = b"\x00"
+RESPONSE_HEADER: bytes = b"\x01"
 
 if os.environ.get("ENVIRONMENT") == "dev":
     MAX_LONG = 10
     KSIZE = 3
 
+logger = logging.getLogger(__name__)
+
 
 T = TypeVar("T")
 TCacheKey = Union[str, int, T]
 TAddress = Tuple[str, int]
-TMessageFuture = Tuple[asyncio.Future, asyncio.Handle]
 
 
 async def gather_coros(d):
@@ -67,22 +109,41 @@ def shared_prefix(args: List[str]) -> str:
     return args[0][:i]
 
 
+def to_limbs(x: int) -> Tuple[int, int, int]:
+    # the top limb is left unbounded so that limb-wise comparison always agrees
+    # with comparing the original integers, however long the key
+    return (x >> (2 * LIMB_BITS), (x >> LIMB_BITS) & LIMB_MASK, x & LIMB_MASK)
+
+
 def random_string(n: int = 10) -> str:
     chars = list(string.ascii_letters + string.digits)
     return "".join([random.choice(chars) for _ in range(n)])
 
 
 class BaseNode:
+    __slots__ = ("key", "digest", "digest_int", "payload", "_long_id", "long_id_limbs")
+
     def __init__(self, key: str):
         self.key = key
         self.digest = pack(self.key)
+        self.digest_int = int.from_bytes(self.digest, "big")
         self.payload: Dict[str, bytes] = {}
-        self._long_id = hex_to_int(self.digest.hex())
+        # the routing table covers [0, MAX_LONG), and longer keys such as
+        # "host:port" addresses would otherwise land past its last bucket
+        self._long_id = hex_to_int(self.digest.hex()) % MAX_LONG
+        self.long_id_limbs: Tuple[int, int, int] = to_limbs(self._long_id)
 
     def distance_to(self, other) -> int:
         x: int = self.long_id ^ other.long_id
         return x
 
+    def is_same_node(self, other) -> bool:
+        return self.long_id == other.long_id
+
+    def distance_tuple(self, other) -> Tuple[int, int, int]:
+        a, b = self.long_id_limbs, other.long_id_limbs
+        return (a[0] ^ b[0], a[1] ^ b[1], a[2] ^ b[2])
+
     @property
     def long_id(self) -> int:
         return self._long_id
@@ -103,20 +164,34 @@ class BaseNode:
 
 
 class PeerNode(BaseNode):
+    __slots__ = ("_addr",)
+
+    def __init__(self, key: str):
+        super().__init__(key)
+        self._addr: Optional[TAddress] = None
+
     def set_payload(self, payload: Any):
         # payload can be a socket connection or what have out
         self.payload = payload
 
     @property
     def addr(self) -> Tuple[str, int]:
-        host, port = self.key.split(":")
-        return (host, int(port))
+        if self._addr is None:
+            host, port = self.key.split(":")
+            self._addr = (host, int(port))
+        return self._addr
 
     def serialize(self) -> str:
         return json.dumps({"key": self.key, "long_id": self.long_id, "value": self.payload})
 
 
+def to_peer_node(host: str, port: int) -> PeerNode:
+    return PeerNode(to_addr(host, port))
+
+
 class CacheNode(BaseNode):
+    __slots__ = ()
+
     def set_payload(self, payload: Dict[str, bytes] = {}):
         self.payload = payload
 
@@ -136,9 +211,11 @@ def is_literal(x) -> bool:
 
 
 class HashCache(Generic[T]):
+    __slots__ = ("entries",)
+
     def __init__(self):
-        # pylint: disable=unsubscriptable-object
-        self.entries: collections.OrderedDict[Union[str, int], T] = collections.OrderedDict()
+        # plain dicts keep insertion order, which is all the cache relies on
+        self.entries: Dict[Union[str, int], T] = {}
 
     @staticmethod
     def _extract_key(value: THashCacheKey, prop: str) -> Union[str, int]:
@@ -150,26 +227,40 @@ class HashCache(Generic[T]):
     def add(self, item: T):
         self.entries[item.key] = item  # type: ignore
 
+    def refresh(self, item: T):
+        # re-add an existing entry as the most recently seen
+        key = item.key  # type: ignore
+        self.entries.pop(key, None)
+        self.entries[key] = item
+
     def get(self, key: Union[str, int]) -> T:
         return self.entries[key]
 
     def items(self) -> List[T]:
         return list(self.entries.values())
 
+    def head(self) -> T:
+        return next(iter(self.entries.values()))
+
+    def values(self) -> ValuesView[T]:
+        # a live view, for callers that only iterate and need no copy
+        return self.entries.values()
+
     def remove(self, item: THashCacheKey):
         key = HashCache._extract_key(item, "key")
         del self.entries[key]
 
     def popitem(self, last: bool) -> T:
-        _, value = self.entries.popitem(last=last)
-        return value
+        if last:
+            _, value = self.entries.popitem()
+            return value
+        return self.entries.pop(next(iter(self.entries)))
 
     def __len__(self) -> int:
         return len(self.entries)
 
-    def __iter__(self) -> Generator[T, None, None]:
-        for _, entry in self.entries.items():
-            yield entry
+    def __iter__(self) -> Iterator[T]:
+        return iter(self.entries.values())
 
     def __contains__(self, item: THashCacheKey) -> bool:
         key = HashCache._extract_key(item, "key")
@@ -179,31 +270,57 @@ class HashCache(Generic[T]):
 class NodeHeap(Generic[TNode]):
     def __init__(self, source_node: TNode, max_size: int):
         self.source_node = source_node
-        self.heap: List[Tuple[int, TNode]] = []
+        self.heap: List[Tuple[Tuple[int, int, int], TNode]] = []
+        self.index: Dict[str, TNode] = {}
         self.contacted: Set[TNode] = set()
         self.max_size = max_size
 
-    def push(self, nodes: List[TNode] = []):
-        while nodes:
-            node = nodes.pop()
-            if node not in self:
-                distance = self.source_node.distance_to(node)
-                heapq.heappush(self.heap, (distance, node))
+    def push(self, nodes: Union[TNode, Iterable[TNode]] = ()):
+        if hasattr(nodes, "long_id"):
+            self.push_one(nodes)  # type: ignore
+        else:
+            self.push_many(nodes)  # type: ignore
 
-    def remove(self, nodes: List[str]):
+    def push_one(self, node: TNode):
+        if node.key in self.index:
+            return
+        self.index[node.key] = node
+        heapq.heappush(self.heap, (self.source_node.distance_tuple(node), node))
+
+    def push_many(self, nodes: Iterable[TNode]):
+        index = self.index
+        distance_tuple = self.source_node.distance_tuple
+        entries = []
+        for node in nodes:
+            if node.key not in index:
+                index[node.key] = node
+                entries.append((distance_tuple(node), node))
+
+        # a single O(n) heapify beats one O(log n) push per node once the
+        # batch is a sizeable fraction of what is already on the heap
+        heap = self.heap
+        if len(entries) > len(heap) // 4:
+            heap.extend(entries)
+            heapq.heapify(heap)
+        else:
+            heappush = heapq.heappush
+            for entry in entries:
+                heappush(heap, entry)
+
+    def remove(self, nodes: List[TNode]):
         if not nodes:
             return
-        node_heap: List[Tuple[int, TNode]] = []
-        for distance, node in self.heap:
-            if node not in nodes:
-                heapq.heappush(node_heap, (distance, node))
+        node_heap: List[Tuple[Tuple[int, int, int], TNode]] = [entry for entry in self.heap if entry[1] not in nodes]
+        heapq.heapify(node_heap)
         self.heap = node_heap
+        self.index = {node.key: node for _, node in self.heap}
 
     def has_exhausted_contacts(self) -> bool:
         return len(self.uncontacted()) == 0
 
     def uncontacted(self) -> List[TNode]:
-        return [n for n in self if n not in self.contacted]
+        contacted = self.contacted
+        return [n for n in self if n not in contacted]
 
     def mark_contacted(self, node: TNode):
         self.contacted.add(node)
@@ -219,25 +336,66 @@ class NodeHeap(Generic[TNode]):
         return iter(map(operator.itemgetter(1), nodes))
 
     def __contains__(self, n: TNode) -> bool:
-        for _, other in self.heap:
-            if n == other:
-                return True
-        return False
+        return n.key in self.index
 
 
 class KBucket(Generic[TNode]):
+    __slots__ = (
+        "start",
+        "end",
+        "range",
+        "ksize",
+        "main_set",
+        "replacement_set",
+        "_depth",
+        "seen_log",
+        "_queued_seen",
+        "_last_seen",
+    )
+
     def __init__(self, start: float, end: float, ksize: int):
         self.start = start
         self.end = end
         self.range = (self.start, self.end)
         self.ksize = ksize
         self.main_set: HashCache[TNode] = HashCache()
-        self.replacement_set: HashCache[TNode] = HashCache()
+        # most buckets never fill, so the replacement set is made on first use
+        self.replacement_set: Optional[HashCache[TNode]] = None
+        # depth only changes with main set membership, so it is computed lazily
+        self._depth: Optional[int] = None
+        # the owning table's heap of (last_seen, id, bucket), see log_seen_to
+        self.seen_log: Optional[List[Tuple[float, int, "KBucket"]]] = None
+        self._queued_seen: Optional[float] = None
         self.set_last_seen()
 
+    @property
+    def last_seen(self) -> float:
+        return self._last_seen
+
+    @last_seen.setter
+    def last_seen(self, ts: float):
+        self._last_seen = ts
+        # one entry per bucket is enough: a newer timestamp is picked up when
+        # the queued one comes due, only an older one has to be queued now
+        if self.seen_log is not None and (self._queued_seen is None or ts < self._queued_seen):
+            self.queue_last_seen()
+
+    def log_seen_to(self, seen_log: Optional[List[Tuple[float, int, "KBucket"]]]):
+        self.seen_log = seen_log
+        self._queued_seen = None
+        if seen_log is not None:
+            self.queue_last_seen()
+
+    def queue_last_seen(self):
+        self._queued_seen = self._last_seen
+        heapq.heappush(self.seen_log, (self._last_seen, id(self), self))  # type: ignore
+
+    def is_queued(self, ts: float) -> bool:
+        return self._queued_seen == ts
+
     @property
     def head(self) -> TNode:
-        return self.main_set.items()[0]
+        return self.main_set.head()
 
     def has_nodes(self) -> bool:
         return len(self) > 0
@@ -254,18 +412,25 @@ class KBucket(Generic[TNode]):
     def get_main_set(self):
         return self.main_set.items()
 
+    def iter_nodes(self) -> ValuesView[TNode]:
+        return self.main_set.values()
+
     def get_replacement_set(self) -> List[Any]:
+        if self.replacement_set is None:
+            return []
         return self.replacement_set.items()
 
-    def get_aggregate_set(self) -> List[TNode]:
-        return self.main_set.items() + self.replacement_set.items()
+    def get_aggregate_set(self) -> Iterator[TNode]:
+        if self.replacement_set is None:
+            return iter(self.main_set.values())
+        return itertools.chain(self.main_set.values(), self.replacement_set.values())
 
     def split(self) -> Tuple["KBucket", "KBucket"]:
         midpoint = (self.range[0] + self.range[1]) / 2
         one: KBucket = KBucket(self.range[0], midpoint, self.ksize)
         two: KBucket = KBucket(midpoint + 1, self.range[1], self.ksize)
 
-        for node in self.main_set.items() + self.replacement_set.items():
+        for node in self.get_aggregate_set():
             bucket = one if node.long_id <= midpoint else two
             bucket.add_node(node)
 
@@ -274,13 +439,14 @@ class KBucket(Generic[TNode]):
     def remove_node(self, node: TNode):
         if node in self.main_set:
             self.main_set.remove(node)
+            self._depth = None
 
             if self.replacement_set:
                 new_node = self.replacement_set.popitem(last=True)
                 self.main_set.add(new_node)
                 return None
 
-        if node in self.replacement_set:
+        if self.replacement_set is not None and node in self.replacement_set:
             self.replacement_set.remove(node)
 
         return None
@@ -296,52 +462,108 @@ class KBucket(Generic[TNode]):
         If the bucket is full, keep track of node in a replacement list,
         """
         if node in self.main_set:
-            self.main_set.remove(node)
-            self.main_set.add(node)
+            self.main_set.refresh(node)
             return True
 
         if len(self) < self.ksize:
             self.main_set.add(node)
+            self._depth = None
             return True
 
-        if node in self.replacement_set:
-            self.replacement_set.remove(node)
-
-        self.replacement_set.add(node)
+        if self.replacement_set is None:
+            self.replacement_set = HashCache()
+        self.replacement_set.refresh(node)
         return False
 
     def has_in_range(self, n: TNode) -> bool:
         return self.range[0] <= n.long_id <= self.range[1]
 
     def depth(self) -> int:
-        return len(shared_prefix([bytes_to_bits(node.digest) for node in self.main_set]))
+        if self._depth is None:
+            self._depth = self._compute_depth()
+        return self._depth
+
+    def _compute_depth(self) -> int:
+        # length of the common bit prefix of the digests, found by OR-ing each
+        # digest's XOR against the first, with digests left-aligned and cut to
+        # the shortest one as a bit-string comparison would
+        nodes = list(self.main_set.values())
+        width = min(len(node.digest) for node in nodes) * 8
+        first = nodes[0].digest_int >> (len(nodes[0].digest) * 8 - width)
+        diff = 0
+        for node in nodes[1:]:
+            diff |= first ^ (node.digest_int >> (len(node.digest) * 8 - width))
+            if diff >> (width - 1):
+                # the leading bits already differ, so no prefix is shared
+                return 0
+        return width - diff.bit_length()
 
     def __len__(self) -> int:
         return len(self.main_set)
 
 
 class RoutingTable:
+
+    NEIGHBOR_CACHE_SIZE = 1024
+
     def __init__(self, protocol, ksize: int, source_node: TNode, max_long: int = MAX_LONG):
         self.protocol = protocol
         self.ksize = ksize
         self.buckets: List[KBucket[TNode]] = []
+        self.upper_bounds: List[float] = []
+        self.seen_log: List[Tuple[float, int, KBucket]] = []
+        # keys of bucket heads with a liveness ping in flight
+        self.pinging: Set[str] = set()
+        # find_neighbors answers, valid until the table next changes
+        self.neighbor_cache: Dict[Tuple[int, int, Optional[int]], List[BaseNode]] = {}
         self.source_node = source_node
         self.max_long = max_long
         self.flush()
 
     def flush(self):
         self.buckets = [KBucket(0, MAX_LONG, self.ksize)]
+        self.upper_bounds = [MAX_LONG]
+        self.seen_log = []
+        self.buckets[0].log_seen_to(self.seen_log)
+        self.neighbor_cache.clear()
 
     def split_bucket(self, index: int):
-        one, two = self.buckets[index].split()
+        self.neighbor_cache.clear()
+        old = self.buckets[index]
+        one, two = old.split()
+        old.log_seen_to(None)
+        one.log_seen_to(self.seen_log)
+        two.log_seen_to(self.seen_log)
         self.buckets[index] = one
         self.buckets.insert(index + 1, two)
+        self.upper_bounds[index] = one.range[1]
+        self.upper_bounds.insert(index + 1, two.range[1])
 
     def lonely_buckets(self) -> List[KBucket]:
+        """
+        Buckets not seen in the past hour, taken from the head of a heap of
+        last-seen times rather than by scanning the whole table
+        """
         hr_ago = time.monotonic() - 3600
-        return [b for b in self.buckets if b.last_seen < hr_ago and b.has_nodes()]
+        seen_log = self.seen_log
+        stale: List[KBucket] = []
+        while seen_log and seen_log[0][0] < hr_ago:
+            ts, _, bucket = heapq.heappop(seen_log)
+            # skip buckets replaced by a split, and entries superseded by an older one
+            if bucket.seen_log is not seen_log or not bucket.is_queued(ts):
+                continue
+            if bucket.last_seen < hr_ago:
+                stale.append(bucket)
+            else:
+                bucket.queue_last_seen()
+
+        # stale buckets stay queued, so the next call reports them again
+        for bucket in stale:
+            bucket.queue_last_seen()
+        return [b for b in stale if b.has_nodes()]
 
     def remove_node(self, n: TNode):
+        self.neighbor_cache.clear()
         index = self.get_bucket_index(n)
         self.buckets[index].remove_node(n)
 
@@ -350,10 +572,12 @@ class RoutingTable:
         return self.buckets[index].is_new_node(n)
 
     def get_bucket_index(self, node: TNode) -> int:
-        for index, bucket in enumerate(self.buckets):
-            if node.long_id < bucket.range[1]:
-                return index
-        raise NotImplementedError
+        # buckets are kept in range order, so the first bucket whose upper
+        # bound is strictly greater than the id is found by bisection
+        index = bisect.bisect_right(self.upper_bounds, node.long_id)
+        if index == len(self.buckets):
+            raise NotImplementedError
+        return index
 
     def add_node(self, n: TNode, attempted: bool = False):
         """
@@ -381,76 +605,76 @@ class RoutingTable:
         For accelerated lookups, we also split the k-bucket if its depth % b is
         not congruent to 0
         """
-        index = self.get_bucket_index(n)
-        bucket = self.buckets[index]
-        bucket.set_last_seen()
-
-        if bucket.is_full() and attempted:
-            return
-
-        if bucket.add_node(n):
-            return
-
-        if bucket.has_in_range(self.source_node) or bucket.depth() % 5 != 0:
-            self.split_bucket(index)
-            return self.add_node(n, True)
-
-        if bucket.is_full():
-            result = asyncio.ensure_future(self.protocol.call_ping(bucket.head))
-            if not result:
-                bucket.main_set.remove(bucket.head.long_id)
-                bucket.main_set.add(n)
-        return
+        self.neighbor_cache.clear()
+        while True:
+            index = self.get_bucket_index(n)
+            bucket = self.buckets[index]
+            bucket.set_last_seen()
 
-    def find_neighbors(self, n: TNode, k: Optional[int] = None, exclude: Optional[TNode] = None) -> List[TNode]:
-        k = k or self.ksize
-        nodes: List[TNode] = []
+            if bucket.is_full() and attempted:
+                return
 
-        for neighbor in TableTraverser(self, n):
-            not_excluded = exclude is None or not neighbor.is_same_node(exclude)
-            if not_excluded:
-                heapq.heappush(nodes, (n.distance_to(neighbor), neighbor))  # type: ignore
+            if bucket.add_node(n):
+                return
 
-            if len(nodes) == k:
+            if not (bucket.has_in_range(self.source_node) or bucket.depth() % 5 != 0):
                 break
 
-        return list(map(operator.itemgetter(1), heapq.nsmallest(k, nodes)))
-
-    def count_of_nodes_in_table(self) -> int:
-        return sum([len(b) for b in self.buckets])
-
-
-class TableTraverser:
-    def __init__(self, table: RoutingTable, start_node: TNode):
-        start_index: int = table.get_bucket_index(start_node)
-        table.buckets[start_index].set_last_seen()
-        self.curr_nodes: List[TNode] = table.buckets[start_index].get_main_set()
-        self.left_buckets = table.buckets[:start_index]
-        self.right_buckets = table.buckets[start_index:]
-        self.left = True
-
-    def __iter__(self):
-        return self
-
-    def __next__(self) -> TNode:
-        if self.curr_nodes:
-            return self.curr_nodes.pop()
+            # retry once against whichever half of the split now covers the node
+            self.split_bucket(index)
+            attempted = True
 
-        if self.left and self.left_buckets:
-            left_bucket = self.left_buckets.pop()
-            if not left_bucket:
-                raise StopIteration
+        # add_node only turns a node away when the bucket is full, so ping the
+        # head and let the newcomer take its place if it does not answer; a
+        # burst of newcomers for one full bucket needs only one ping of its head
+        head = bucket.head
+        if head.key in self.pinging:
+            return
+        self.pinging.add(head.key)
+        ping = asyncio.ensure_future(self.protocol.call_ping(head))
+        ping.add_done_callback(functools.partial(self._evict_if_unresponsive, head))
 
-            self.curr_nodes = left_bucket.get_main_set()
-            self.left = False
-            return next(self)  # type: ignore
+    def _evict_if_unresponsive(self, head: TNode, ping: asyncio.Future):
+        self.pinging.discard(head.key)
+        if ping.cancelled() or ping.exception() is not None or ping.result():
+            return
+        # the head's bucket may have split while we waited, so look it up again;
+        # removing it promotes the newest replacement, which is the new node
+        self.remove_node(head)
 
-        if self.right_buckets:
-            self.curr_nodes = self.right_buckets.pop(0).get_main_set()
-            self.left = True
-            return next(self)  # type: ignore
+    def find_neighbors(
+        self, n: BaseNode, k: Optional[int] = None, exclude: Optional[BaseNode] = None
+    ) -> List[BaseNode]:
+        k = k or self.ksize
+        target = n.long_id
+        # same test as is_same_node, without a method call per candidate
+        exclude_id = exclude.long_id if exclude is not None else None
+        self.buckets[self.get_bucket_index(n)].set_last_seen()
+
+        # lookups, stores and refreshes converge on the same targets, and the
+        # table changes far less often than it is queried
+        cache_key = (target, k, exclude_id)
+        neighbors = self.neighbor_cache.get(cache_key)
+        if neighbors is not None:
+            return list(neighbors)
+
+        # xor distance is not monotonic in bucket order, so every bucket is a
+        # candidate; nsmallest keeps only a k-sized heap while scanning them once
+        candidates = (
+            (target ^ neighbor.long_id, neighbor)
+            for bucket in self.buckets
+            for neighbor in bucket.iter_nodes()
+            if neighbor.long_id != exclude_id
+        )
+        neighbors = [neighbor for _, neighbor in heapq.nsmallest(k, candidates, key=operator.itemgetter(0))]
+
+        if len(self.neighbor_cache) >= RoutingTable.NEIGHBOR_CACHE_SIZE:
+            self.neighbor_cache.clear()
+        self.neighbor_cache[cache_key] = neighbors
+        return list(neighbors)
 
-        raise StopIteration
+    def count_of_nodes_in_table(self) -> int:
+        return sum(len(b) for b in self.buckets)
 
 
 class Datagram:
@@ -464,11 +688,9 @@ class Datagram:
             self.data = data
             self.id, (self.rpc_method_name, self.args) = (
                 data[1:21],
-                umsgpack.unpackb(data[21:]),
+                unpackb(memoryview(data)[21:]),
             )
-            self.rpc_method = getattr(self, f"rpc_{self.rpc_method_name}", None)
             self._malformed = False
-        self.payload: Optional[TMessageFuture] = None
 
     @property
     def malformed(self) -> bool:
@@ -476,149 +698,194 @@ class Datagram:
 
     @property
     def key(self) -> str:
-        return self.id.decode()
+        return self.id.hex()
 
-    def set_payload(self, payload: TMessageFuture):
-        self.payload = payload
-
-    async def exec_rpc_method(self, rpc_method):
+    def exec_rpc_method(self, rpc_method):
         return rpc_method(self.sender, *self.args)
 
-    def end_fut(self, data: bytes):
-        if not self.payload:
-            return
-
-        fut, timeout = self.payload
-        fut.set_result((True, data))
-        timeout.cancel()
-
-    def set_fut_result(self):
-        fut, _ = self.payload
-        fut.set_result((False, None))
-
 
 class TDatagramProtocol(asyncio.DatagramProtocol):
-    REQUEST: bytes
-    RESPONSE: bytes
+    REQUEST: int
+    RESPONSE: int
     MIN_MSG_SIZE: int
     MAX_RPC_METHOD_SIZE: int
 
 
 class RPCDatagramProtocol(TDatagramProtocol):
 
-    REQEUST = b"\x00"
-    RESPONSE = b"\x01"
+    REQUEST = REQUEST_HEADER[0]
+    RESPONSE = RESPONSE_HEADER[0]
     MIN_MSG_SIZE = 22
     MAX_RPC_METHOD_SIZE = 8192
 
     def __init__(self, source_node: PeerNode, wait: int = 5):
         self.source_node = source_node
         self.wait = wait
-        self.msg_cache: HashCache[Datagram] = HashCache()
+        # keyed by the message id as an int, which hashes cheaper than bytes
+        self.futures: Dict[int, asyncio.Future] = {}
+        self.deadlines: Dict[int, float] = {}
         self.transport: Optional[asyncio.BaseTransport] = None
+        # bound once instead of looked up on every packet; connection_made
+        # rebinds it to the loop that actually serves the endpoint
+        self.loop: asyncio.AbstractEventLoop = asyncio.get_event_loop()
+        self.sweeper: Optional[asyncio.TimerHandle] = None
+        # handlers are resolved and classified once, so a request for a sync
+        # handler can be answered inline without scheduling a task
+        self._rpc_dispatch: Dict[str, Tuple[Callable, bool]] = {
+            name[4:]: (getattr(self, name), asyncio.iscoroutinefunction(getattr(self, name)))
+            for name in dir(self)
+            if name.startswith("rpc_") and callable(getattr(self, name))
+        }
+        self._header_dispatch: Dict[int, Callable[[bytes, Tuple[str, int]], None]] = {
+            RPCDatagramProtocol.REQUEST: self._dispatch_request,
+            RPCDatagramProtocol.RESPONSE: self._accept_response,
+        }
 
     def connection_made(self, transport: asyncio.BaseTransport):
         self.transport = transport
+        self.loop = asyncio.get_event_loop()
 
-    def datagram_received(self, data: bytes, addr: Tuple[str, int]):
-        asyncio.ensure_future(self._solve_datagram(data, addr))
+    def connection_lost(self, exc: Optional[Exception]):
+        if self.sweeper:
+            self.sweeper.cancel()
+            self.sweeper = None
 
-    def _solve_datagram(self, data: bytes, addr: Tuple[str, int]):
+        # no response can arrive any more, so fail everything still waiting
+        for fut in self.futures.values():
+            if not fut.done():
+                fut.set_result((False, None))
+        self.futures.clear()
+        self.deadlines.clear()
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]):
         if len(data) < RPCDatagramProtocol.MIN_MSG_SIZE:
             return
 
-        if data[0] == RPCDatagramProtocol.REQUEST:
-            self._accept_request(data, addr)
+        handler = self._header_dispatch.get(data[0])
+        if handler is not None:
+            handler(data, addr)
 
-        elif data[0] == RPCDatagramProtocol.RESPONSE:
-            self._accept_response(data, addr)
+    def _dispatch_request(self, data: bytes, addr: Tuple[str, int]):
+        # this runs inside the transport's callback, so nothing a peer sends
+        # may raise out of here
+        try:
+            msg = Datagram(addr, data)
+            handler = self._rpc_dispatch.get(msg.rpc_method_name)
+        except Exception:  # pylint: disable=broad-except
+            logger.debug("dropping malformed request from %s", addr)
+            return
 
-        else:
+        if not handler:
+            logger.debug("rpc_method %s not found in protocol", msg.rpc_method_name)
             return
 
-    async def _accept_request(self, data: bytes, addr: Tuple[str, int]):
-        msg = Datagram(addr, data)
-        rpc_method = getattr(self, f"rpc_{msg.rpc_method_name}", None)
-
-        criteria = [
-            (not rpc_method, "rpc_method not found in protocol"),
-            (not callable(rpc_method), "rpc_method not callable"),
-            (
-                not asyncio.iscoroutinefunction(rpc_method),
-                "rpc_method is not a coroutine",
-            ),
-        ]
+        rpc_method, is_coroutine = handler
+        if is_coroutine:
+            self.loop.create_task(self._accept_request(msg, rpc_method))
+            return
 
-        for criterium, msg in criteria:  # type: ignore
-            if criterium:
-                print(msg)
-                return
+        try:
+            self._respond(msg, msg.exec_rpc_method(rpc_method))
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("rpc_method %s failed", msg.rpc_method_name)
 
-        # FIXME: Do you need to pass rpc_method *args here too?
-        rpc_result = await msg.exec_rpc_method(rpc_method)
-        response = RPCDatagramProtocol.RESPONSE + msg.id + umsgpack.packb(rpc_result)
+    async def _accept_request(self, msg: Datagram, rpc_method: Callable):
+        try:
+            self._respond(msg, await msg.exec_rpc_method(rpc_method))
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("rpc_method %s failed", msg.rpc_method_name)
 
-        self.transport.sendto(response, addr)  # type: ignore
+    def _respond(self, msg: Datagram, rpc_result: Any):
+        response = b"".join((RESPONSE_HEADER, msg.id, packb(rpc_result)))
+        self._sendto(response, msg.sender)
 
-    async def _accept_response(self, data: bytes, addr: Tuple[str, int]):
+    def _accept_response(self, data: bytes, addr: Tuple[str, int]):
         # FIXME: Should we do something with data here as in request? For the most part
         # a request and a response are the same thing
-        msg_id, data = data[1:21], umsgpack.unpackb(data[21:])
-        id_as_str = msg_id.decode()
-        msg_args = (base64.b64encode(msg_id), addr)
-
-        if not id_as_str in self.msg_cache:
+        key = int.from_bytes(data[1:21], "big")
+        fut = self.futures.pop(key, None)
+        if fut is None:
             return
 
-        msg = self.msg_cache.get(id_as_str)
-        msg.end_fut(data)
-
-        self.msg_cache.remove(id_as_str)
-
-    def time_msg_out(self, msg_id: bytes):
+        del self.deadlines[key]
+        try:
+            result = (True, unpackb(memoryview(data)[21:]))
+        except Exception:  # pylint: disable=broad-except
+            # the future is no longer swept, so it has to be resolved here
+            logger.debug("dropping malformed response from %s", addr)
+            result = (False, None)
+        if not fut.done():
+            fut.set_result(result)
+
+    def _sendto(self, data: bytes, addr: Tuple[str, int]):
+        if self.transport is None:
+            raise RuntimeError("cannot send before the endpoint is up")
+        self.transport.sendto(data, addr)  # type: ignore
+
+    def sweep_timeouts(self):
         """
         A speed and size optimization used to keep cache clean by removing
         stale futures (requests with no responses and visa versa)
+
+        Every request waits the same amount of time and dicts keep insertion
+        order, so expired deadlines are always at the head and the sweep can
+        stop at the first one still within its deadline
         """
-        # args = (base64.b64encode(msg_id), self.wait)
-        msg_id_str = msg_id.decode()
-        if not msg_id_str in self.msg_cache:
-            return
+        loop = self.loop
+        now = loop.time()
+        deadlines = self.deadlines
+        while deadlines:
+            key = next(iter(deadlines))
+            if deadlines[key] > now:
+                break
+            del deadlines[key]
+            fut = self.futures.pop(key)
+            if not fut.done():
+                fut.set_result((False, None))
 
-        msg: Datagram = self.msg_cache.get(msg_id.decode())
+        # go idle once nothing is outstanding; the next request restarts us
+        self.sweeper = loop.call_later(self.wait / 10, self.sweep_timeouts) if deadlines else None
 
-        msg.set_fut_result()
-        self.msg_cache.remove(msg.id.decode())
+    def ping(self, addr: Tuple[str, int], *args) -> Optional[asyncio.Future]:
+        return self._send_rpc("ping", addr, *args)
 
-    def __getattr__(self, name: str):
+    def store(self, addr: Tuple[str, int], *args) -> Optional[asyncio.Future]:
+        return self._send_rpc("store", addr, *args)
 
-        if name.startswith("_") or name.startswith("rpc_"):
-            return getattr(super(), name)
+    def find_node(self, addr: Tuple[str, int], *args) -> Optional[asyncio.Future]:
+        return self._send_rpc("find_node", addr, *args)
 
-        try:
-            return getattr(super(), name)
-        except AttributeError:
-            pass
+    def find_value(self, addr: Tuple[str, int], *args) -> Optional[asyncio.Future]:
+        return self._send_rpc("find_value", addr, *args)
 
-        def build_dgram(addr: Tuple[str, int], rpc_args):
-            rpc_method_name = name
-            msg_id = hashlib.sha1(os.urandom(32)).digest()
-            data = umsgpack.packb([rpc_method_name, rpc_args])
+    def store_many(self, addr: Tuple[str, int], *args) -> Optional[asyncio.Future]:
+        return self._send_rpc("store_many", addr, *args)
 
-            if len(data) > RPCDatagramProtocol.MAX_RPC_METHOD_SIZE:
-                return
+    def _send_rpc(self, rpc_method_name: str, addr: Tuple[str, int], *args) -> Optional[asyncio.Future]:
+        return self._send_packed(packb([rpc_method_name, args]), addr)
+
+    def _send_packed(self, data: bytes, addr: Tuple[str, int]) -> Optional[asyncio.Future]:
+        """
+        Send an already packed [rpc_method_name, args] body, so a request
+        going to many peers is only serialized once
+        """
+        msg_id = os.urandom(20)
+
+        if len(data) > RPCDatagramProtocol.MAX_RPC_METHOD_SIZE:
+            return None
 
-            request = RPCDatagramProtocol.REQUEST + msg_id + data
-            self.transport.sendto(request, addr)  # type: ignore
+        request = b"".join((REQUEST_HEADER, msg_id, data))
+        self._sendto(request, addr)
 
-            loop = asyncio.get_event_loop()
-            fut = loop.create_future()
-            timeout = loop.call_later(self.wait, self.time_msg_out, msg_id)
-            msg = Datagram(self.source_node.addr, data=request)
-            msg.set_payload((fut, timeout))
-            self.msg_cache.add(msg)
+        loop = self.loop
+        fut = loop.create_future()
+        key = int.from_bytes(msg_id, "big")
+        self.futures[key] = fut
+        self.deadlines[key] = loop.time() + self.wait
 
-        return build_dgram
+        if self.sweeper is None:
+            self.sweeper = loop.call_later(self.wait / 10, self.sweep_timeouts)
+        return fut
 
 
 class CacheStorage(Generic[T]):
@@ -638,8 +905,7 @@ class CacheStorage(Generic[T]):
         return 1
 
     def remove(self, key: Union[str, int]):
-        if key in self.cache:
-            del self.cache[key]
+        self.cache.pop(key, None)
 
     def has_capacity(self) -> bool:
         return len(self.cache) < self.max_items and self._memory_usage() < self.max_space
@@ -649,40 +915,55 @@ class CacheStorage(Generic[T]):
         x: int = process.memory_info().rss
         return x
 
-    def __iter__(self) -> Generator[T, None, None]:
-        for _, node in self.cache.items():
-            yield node
+    def __iter__(self) -> Iterator[T]:
+        return iter(self.cache.values())
 
 
 class RPCContainer:
-    def __init__(self, protocol: "KademliaProtocol"):
-        self.protocol = protocol
+    """
+    The rpc_* handlers and call_* helpers of a Kademlia node, mixed into a
+    datagram protocol that provides everything declared below
+    """
+
+    REPLICATION_YIELD_EVERY = 64
+
+    source_node: PeerNode
+    router: RoutingTable
+    storage: CacheStorage
+    loop: asyncio.AbstractEventLoop
+    peer_node: Callable[[str, int], PeerNode]
+
+    def ping(self, addr: Tuple[str, int], *args) -> Optional[asyncio.Future]:
+        raise NotImplementedError
 
-    def store(self, requestor: PeerNode, payload: CacheNode):
+    def store_many(self, addr: Tuple[str, int], *args) -> Optional[asyncio.Future]:
         raise NotImplementedError
 
-    def rpc_stun(self, sender: PeerNode) -> PeerNode:
+    def _send_packed(self, data: bytes, addr: Tuple[str, int]) -> Optional[asyncio.Future]:
+        raise NotImplementedError
+
+    def rpc_stun(self, sender: TAddress) -> TAddress:
         return sender
 
-    def rpc_ping(self, sender: PeerNode) -> PeerNode:
-        self.welcome_node_if_new(sender)
-        return self.protocol.source_node
+    def rpc_ping(self, sender: TAddress) -> str:
+        self.welcome_node_if_new(self.peer_node(*sender))
+        return self.source_node.key
 
-    def rpc_store(self, sender: PeerNode, key: str, value: bytes):
-        self.welcome_node_if_new(sender)
-        self.protocol.storage.set(key, value)
+    def rpc_store(self, sender: TAddress, key: str, value: bytes):
+        self.welcome_node_if_new(self.peer_node(*sender))
+        self.storage.set(key, value)
 
-    def rpc_find_node(self, sender: PeerNode, to_find: TNode) -> List[TAddress]:
-        self.welcome_node_if_new(sender)
-        neighbors = self.protocol.router.find_neighbors(to_find, exclude=self.protocol.source_node)  # type: ignore
-        peers = list(filter(lambda n: isinstance(n, PeerNode), neighbors))
-        return list(map(tuple, peers))  # type: ignore
+    def rpc_find_node(self, sender: TAddress, key: str) -> List[str]:
+        peer = self.peer_node(*sender)
+        self.welcome_node_if_new(peer)
+        neighbors = self.router.find_neighbors(BaseNode(key), exclude=peer)
+        return [n.key for n in neighbors if isinstance(n, PeerNode)]
 
-    def rpc_find_value(self, sender: PeerNode, value_node: TNode) -> CacheNode:
-        self.welcome_node_if_new(sender)
-        found_node = self.protocol.storage.get(value_node.long_id)
+    def rpc_find_value(self, sender: TAddress, value_node: TNode) -> CacheNode:
+        self.welcome_node_if_new(self.peer_node(*sender))
+        found_node = self.storage.get(value_node.long_id)
         if not found_node:
-            self.rpc_find_node(sender, value_node)
+            self.rpc_find_node(sender, value_node.key)
         return found_node  # type: ignore
 
     def welcome_node_if_new(self, node: PeerNode):
@@ -698,29 +979,98 @@ class RPCContainer:
         than the furtherst in that list, and the node for this server
         is closer than the closest in that list, then store the key/value
         on the new node
+
+        Only the routing table update happens inline; the storage scan runs
+        as a background task so the RPC that introduced the node can be
+        answered straight away
         """
-        if not self.protocol.router.is_new_node(node):
+        if not self.router.is_new_node(node):
             return
 
         if not isinstance(node, PeerNode):
             raise TypeError("welcome_node_if_new called with non-PeerNode")
 
-        for node_ in self.protocol.storage:
-            neighbors = self.protocol.router.find_neighbors(node_)
-            if neighbors:
-                furthest = neighbors[-1].distance_to(node_)
-                is_closer_than_furthest = node.distance_to(node_) < furthest
-                closest_distance_to_new = neighbors[0].distance_to(node_)
-                curr_is_closer = self.protocol.source_node.distance_to(node_) < closest_distance_to_new
+        self.loop.create_task(self._welcome_replication(node))
+        self.router.add_node(node)
+
+    async def _welcome_replication(self, node: PeerNode):
+        pending: List[CacheNode] = []
+        router = self.router
+        new_id = node.long_id
+        source_id = self.source_node.long_id
 
-            if not neighbors or (is_closer_than_furthest and curr_is_closer):
-                asyncio.ensure_future(self.call_store(node, node_))
+        # gather the table's ids in one pass instead of a find_neighbors walk
+        # per stored key; the new node is already in the table, so leave it out
+        neighbor_ids = [n.long_id for bucket in router.buckets for n in bucket.iter_nodes() if n.long_id != new_id]
 
-        self.protocol.router.add_node(node)
+        # snapshot storage, since it may change while we yield to the loop
+        for i, node_ in enumerate(list(self.storage)):
+            if i and i % RPCContainer.REPLICATION_YIELD_EVERY == 0:
+                await asyncio.sleep(0)
 
-    async def call_store(self, requestee: PeerNode, payload: CacheNode):
-        result = await self.store(requestee, payload)
-        return self.handle_call_response(result, requestee)
+            target = node_.long_id
+            nearest = heapq.nsmallest(router.ksize, (target ^ n for n in neighbor_ids))
+            if not nearest:
+                pending.append(node_)
+                continue
+
+            # closer than the furthest of the k nearest, and we are closer than the nearest
+            if new_id ^ target < nearest[-1] and source_id ^ target < nearest[0]:
+                pending.append(node_)
+
+        if pending:
+            pairs = [(node_.key, list(node_.payload.values())[0]) for node_ in pending]
+            await self.call_store_many(node, pairs)
+
+    async def call_ping(self, requestee: PeerNode) -> bool:
+        fut = self.ping(requestee.addr)
+        if fut is None:
+            return False
+        ok, _ = await fut
+        return ok
+
+    @staticmethod
+    def pack_store_request(node: CacheNode) -> bytes:
+        return packb(["store_many", ([(node.key, list(node.payload.values())[0])],)])
+
+    async def call_store_packed(self, requestee: PeerNode, data: bytes) -> bool:
+        fut = self._send_packed(data, requestee.addr)  # type: ignore
+        if fut is None:
+            return False
+        ok, _ = await fut
+        return bool(self.handle_call_response(ok, requestee))
+
+    async def call_store_many(self, requestee: PeerNode, pairs: List[Tuple[str, bytes]]) -> bool:
+        for chunk in RPCContainer._chunk_pairs(pairs):
+            fut = self.store_many(requestee.addr, chunk)  # type: ignore
+            if fut is None:
+                return False
+            ok, _ = await fut
+            if not self.handle_call_response(ok, requestee):
+                # the node stopped answering, so stop sending it the rest
+                return False
+        return True
+
+    @staticmethod
+    def _chunk_pairs(pairs: List[Tuple[str, bytes]]) -> Iterator[List[Tuple[str, bytes]]]:
+        # keep every store_many request within the protocol's payload limit,
+        # leaving room for the method name and array headers
+        limit = RPCDatagramProtocol.MAX_RPC_METHOD_SIZE - 64
+        chunk: List[Tuple[str, bytes]] = []
+        size = 0
+        for pair in pairs:
+            pair_size = len(packb(pair))
+            if pair_size > limit:
+                # too big for any single datagram, so it cannot be replicated this way
+                logger.warning("skipping %s: %i bytes exceeds the store_many limit", pair[0], pair_size)
+                continue
+            if chunk and size + pair_size > limit:
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(pair)
+            size += pair_size
+        if chunk:
+            yield chunk
 
     def handle_call_response(self, result, sender):
         raise NotImplementedError
@@ -735,6 +1085,9 @@ class KademliaProtocol(RPCDatagramProtocol, RPCContainer):
         self.router = RoutingTable(self, ksize, source_node)
         self.storage = storage
         self.ksize = ksize
+        # a peer's identity is its address, so hot senders can share one node;
+        # the cache is per protocol so no node is shared with another instance
+        self.peer_node = functools.lru_cache(maxsize=4096)(to_peer_node)
 
     """
     FIXME
@@ -751,34 +1104,54 @@ class KademliaProtocol(RPCDatagramProtocol, RPCContainer):
             nodes.append(n)
         return nodes
 
-    def rpc_stun(self, sender: PeerNode) -> PeerNode:
+    def rpc_stun(self, sender: TAddress) -> TAddress:
         return sender
 
-    def rpc_ping(self, sender: PeerNode) -> PeerNode:
-        self.welcome_node_if_new(sender)
-        return self.source_node
+    def rpc_ping(self, sender: TAddress) -> str:
+        self.welcome_node_if_new(self.peer_node(*sender))
+        return self.source_node.key
 
-    def rpc_store(self, sender: PeerNode, to_store: CacheNode):
-        self.welcome_node_if_new(sender)
+    def rpc_store(self, sender: TAddress, to_store: CacheNode):
+        self.welcome_node_if_new(self.peer_node(*sender))
         self.storage.add_node(to_store)
 
-    def rpc_find_node(self, sender: PeerNode, to_find: TNode) -> List[TAddress]:
-        self.welcome_node_if_new(sender)
-        neighbors = self.router.find_neighbors(to_find, exclude=sender)  # type: ignore
-        return list(map(tuple, neighbors))  # type: ignore
+    def rpc_store_many(self, sender: TAddress, pairs: List[Tuple[str, bytes]]) -> bool:
+        self.welcome_node_if_new(self.peer_node(*sender))
+        for key, value in pairs:
+            node = CacheNode(key)
+            node.set_payload({key: value})
+            self.storage.add_node(node)
+        return True
+
+    def rpc_find_node(self, sender: TAddress, key: str) -> List[str]:
+        # only the key crosses the wire; ids are too wide for msgpack ints,
+        # and a peer's key is its address
+        peer = self.peer_node(*sender)
+        self.welcome_node_if_new(peer)
+        neighbors = self.router.find_neighbors(BaseNode(key), exclude=peer)
+        return [n.key for n in neighbors if isinstance(n, PeerNode)]
 
-    def rpc_find_value(self, sender: PeerNode, value_node: TNode) -> CacheNode:
-        self.welcome_node_if_new(sender)
+    def rpc_find_value(self, sender: TAddress, value_node: TNode) -> CacheNode:
+        self.welcome_node_if_new(self.peer_node(*sender))
         result = self.storage.get(value_node.long_id)
         if result is None:
-            return self.rpc_find_value(self.source_node, value_node)
+            return self.rpc_find_value(self.source_node.addr, value_node)
         return result
 
-    async def call_find_node(self, to_find: TNode) -> List[TNodeAsTuple]:
-        neighbors = await self.find_node(self.source_node, to_find)
-        return self.handle_call_response(neighbors, self.source_node)
-
-    def handle_call_response(self, result: List[TNodeAsTuple], sender: PeerNode):
+    async def call_find_node(self, requestee: PeerNode, to_find: BaseNode) -> Optional[List[str]]:
+        """
+        Ask `requestee` for the keys of the nodes it knows closest to `to_find`;
+        None means it did not answer, as opposed to knowing nobody
+        """
+        fut = self.find_node(requestee.addr, to_find.key)
+        if fut is None:
+            return None
+        ok, keys = await fut
+        if not self.handle_call_response(ok, requestee):
+            return None
+        return keys
+
+    def handle_call_response(self, result: Any, sender: PeerNode):
         if not result:
             return self.router.remove_node(sender)
         return result
@@ -791,13 +1164,19 @@ class Server:
         self.ksize = ksize
         self.alpha = alpha
         self.refresh_interval = 60
+        self.bootstrap_timeout = 2.0
         self.state = "./node.state"
 
         self.udp_transport = None
         self.protocol = KademliaProtocol(self.node, self.storage, self.ksize, wait=5)
-        self.refresh_loop = None
-        self.save_state_loop = None
+        self.refresh_loop: Optional[asyncio.Task] = None
+        self.save_state_loop: Optional[asyncio.Task] = None
         self.listener = None
+        # caps how many background operations (whole refresh crawls, single
+        # store RPCs and bootstrap pings) run at once, so a burst of them cannot
+        # overrun the peers' receive queues; a crawl keeps up to alpha RPCs of
+        # its own in flight. Created on first use, so it binds to the running loop
+        self.fanout_limit: Optional[asyncio.Semaphore] = None
 
     def stop(self):
         if self.udp_transport is not None:
@@ -812,19 +1191,61 @@ class Server:
         if self.listener:
             asyncio.ensure_future(self.listener.wait_closed())
 
+    async def _bounded(self, coro: Awaitable[T]) -> T:
+        if self.fanout_limit is None:
+            self.fanout_limit = asyncio.Semaphore(self.alpha * 4)
+        async with self.fanout_limit:
+            return await coro
+
+    def refresh_table(self):
+        self.refresh_loop = asyncio.ensure_future(self._refresh_regularly())
+
+    async def _refresh_regularly(self):
+        # one long-lived task for the server's lifetime; stop() cancels it
+        while True:
+            try:
+                await self._refresh_table()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("refreshing the routing table failed")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def _refresh_table(self):
+        """
+        Section 2.3
+
+        Refresh buckets that have not seen a lookup in the past hour by
+        crawling for a node in each of them
+        """
+        spiders = []
+        for node in self.protocol.get_refreshable_nodes():
+            nearest = self.protocol.router.find_neighbors(node, self.alpha)
+            spider = NodeSpiderCrawler(self.protocol, node, nearest, self.ksize, self.alpha)
+            spiders.append(self._bounded(spider.find()))
+        await asyncio.gather(*spiders)
+
     def bootstrap_neighbors(self, addrs: List[str]):
         neighbors = self.protocol.find_neighbors(self.node)
         return []
 
-    async def bootstrap(self, addrs: Tuple[str, int]):
-        coros = list(map(self.bootstrap_node, addrs))  # type: ignore
-        neighbors = await asyncio.gather(*coros)
-        neighbors = filter(lambda x: x is not None, neighbors)
+    async def bootstrap(self, addrs: List[TAddress]) -> List[TNode]:
+        # each ping gets its own deadline once it holds a permit, so dead
+        # addresses cannot starve the rest of the list; a ping that fails
+        # or times out only loses that one address
+        pings = [self._bounded(asyncio.wait_for(self.bootstrap_node(addr), self.bootstrap_timeout)) for addr in addrs]
+        results = await asyncio.gather(*pings, return_exceptions=True)
+
+        neighbors = [node for node in results if isinstance(node, PeerNode)]
         spider = NodeSpiderCrawler(self.protocol, self.node, neighbors, self.ksize, self.alpha)
-        return spider.find()
+        return await spider.find()
 
-    def bootstrap_node(self, node: PeerNode) -> PeerNode:
-        return self.protocol.ping(node)
+    async def bootstrap_node(self, addr: TAddress) -> Optional[PeerNode]:
+        ping = self.protocol.ping(addr)
+        if ping is None:
+            return None
+        ok, _ = await ping
+        # peer_node hands back the same node for an address we have seen, so
+        # bootstrapping from saved state does not rebuild every peer
+        return self.protocol.peer_node(*addr) if ok else None
 
     def get(self, key: str):
         result = self.storage.get(key)
@@ -835,11 +1256,12 @@ class Server:
         nearest = self.protocol.router.find_neighbors(node)
 
         if not nearest:
-            logger.info(json.dumps({
-                "caller": self.__class__.__name__,
-                "ts": time.time(),
-                "details": f"{self.source_node.key} has no known neighbors for {key}"
-                }))
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(json.dumps({
+                    "caller": self.__class__.__name__,
+                    "ts": time.time(),
+                    "details": f"{self.node.key} has no known neighbors for {key}"
+                    }))
             return
 
         spider = ValueSpiderCrawler(self.protocol, node, nearest, self.ksize, self.alpha)
@@ -849,55 +1271,113 @@ class Server:
         node = CacheNode(key, value)
         return self.store(node)
 
-    async def store(self, node: CacheNode): -> bool:
+    async def store(self, node: CacheNode) -> bool:
         nearest = self.protocol.router.find_neighbors(node)
         if not nearest:
-            logger.info(json.dumps({
-                "caller": self.__class__.__name__,
-                "ts": time.time(),
-                "details": f"{self.source_node.key} has no known neighbors with which to share {node.key}"
-                }))
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(json.dumps({
+                    "caller": self.__class__.__name__,
+                    "ts": time.time(),
+                    "details": f"{self.node.key} has no known neighbors with which to share {node.key}"
+                    }))
             return 
 
         spider = NodeSpiderCrawler(self.protocol, node, nearest, self.ksize, self.alpha)
-        found = await spider.find()
-        furthest = max([n.distance_to(node) for n in found])
-        if self.source_node.distance_to(node) < furthest:
+        # one pass keeps the peers that can hold the value and the furthest
+        # of them; a crawl can surface the same peer, or us, more than once,
+        # but each peer only needs the value stored with it once
+        found: Dict[str, PeerNode] = {}
+        furthest = 0
+        for n in await spider.find():
+            if n.key in found or n.key == self.node.key or not isinstance(n, PeerNode):
+                continue
+            found[n.key] = n
+            distance = n.distance_to(node)
+            if distance > furthest:
+                furthest = distance
+
+        if self.node.distance_to(node) < furthest:
             self.storage.add_node(node)
 
-        coros = [self.protocol.call_store(n, node) for n in found]
-        return any(await asyncio.gather(*coros))
+        # every peer gets the same request body, so pack it once
+        request = self.protocol.pack_store_request(node)
+        stores = [
+            asyncio.ensure_future(self._bounded(self.protocol.call_store_packed(n, request))) for n in found.values()
+        ]
+        for store in stores:
+            store.add_done_callback(Server._log_store_failure)
+
+        # report success as soon as one peer holds the value; the other stores
+        # are left running rather than cancelled, so it still reaches all k
+        for stored in asyncio.as_completed(stores):
+            if await stored:
+                return True
+        return False
+
+    @staticmethod
+    def _log_store_failure(stored: asyncio.Future):
+        # stores still running when store() returns are never awaited again,
+        # so their errors are retrieved here rather than lost with the task
+        if not stored.cancelled() and stored.exception() is not None:
+            logger.error("storing a value with a peer failed", exc_info=stored.exception())
 
     def save_state(self):
+        self._write_state(self._pack_state())
+
+    def _pack_state(self) -> bytes:
+        # msgpack is already our wire format, and unlike pickle it cannot run
+        # code when a tampered state file is loaded
         state = {
-            "addr": to_addr((self.interface, self.port)),
+            "addr": self.node.addr,
             "ksize": self.ksize,
             "alpha": self.alpha,
-            "id": self.source_node.key,
-            # FIXME: make sure this returns something serializable
-            "neighbors": self.bootstrapable_neighbors()
+            "neighbors": [
+                n.addr
+                for bucket in self.protocol.router.buckets
+                for n in bucket.iter_nodes()
+                if isinstance(n, PeerNode)
+            ],
         }
+        return packb(state)
+
+    def _write_state(self, data: bytes):
+        # write beside the old state, flush it to disk and only then swap it
+        # in, so neither a crash nor a power loss leaves a truncated file behind
+        tmp = self.state + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.state)
+
+    @classmethod
+    def load_state(cls, path: str = "./node.state") -> Tuple["Server", List[TAddress]]:
+        """
+        Build a server from a saved state file, returning it alongside the
+        neighbors it had; the caller bootstraps from those once it is listening
+        """
+        with open(path, "rb") as f:
+            state = unpackb(f.read())
 
-        ts = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with open(f"./state/{self.source_node.key}.{ts}.txt", "wb") as f:
-            pickle.dump(data, f)
-
-        return 
-            
-
-    def load_state(self):
-        data = {}
-        with open(f"./state/{self.source_node.key}.{ts}.txt", "rb") as f:
-            data = pickle.load(f)
+        host, port = state["addr"]
+        server = cls(host, port, ksize=state["ksize"], alpha=state["alpha"])
+        server.state = path
+        return server, [tuple(addr) for addr in state["neighbors"]]  # type: ignore
 
-        server = Server(**data)
-        asyncio.ensure_future(self.bootstra(data["neighbors"]))
-        return server
+    def save_state_regularly(self, frequency: int = 60):
+        self.save_state_loop = asyncio.ensure_future(self._save_state_regularly(frequency))
 
-    def save_state_loop(self, frequency: int = 60):
-        self.save_state()
+    async def _save_state_regularly(self, frequency: int):
         loop = asyncio.get_event_loop()
-        self.save_state_loop = loop.call_later(frequency, self.save_state_loop)
+        while True:
+            # pack on the loop, where the routing table cannot change underneath
+            # us, and leave the blocking write to a worker thread; awaiting it
+            # keeps two writes from racing on the temporary file
+            try:
+                await loop.run_in_executor(None, self._write_state, self._pack_state())
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("saving state failed")
+            await asyncio.sleep(frequency)
 
 
 class SpiderCrawler:
@@ -906,7 +1386,7 @@ class SpiderCrawler:
         self.start_node = start_node
         self.ksize = ksize
         self.alpha = alpha
-        self.nearest = NodeHeap[TNode](self.start_node, self.ksize)
+        self.nearest = NodeHeap[BaseNode](self.start_node, self.ksize)
         self.last_ids_crawled: Set[str] = set()
         self.nearest.push(neighbors)
 
@@ -929,13 +1409,15 @@ class SpiderCrawler:
             self.nearest.mark_contacted(node)
 
         coros_response = await gather_coros(coros)
-        return self._parse_rpc_results(coros_response)
+        return await self._parse_rpc_results(coros_response)
 
     async def _parse_rpc_results(self, coros_response):
         raise NotImplementedError
 
 
 class RawRPCResponse:
+    __slots__ = ("items",)
+
     def __init__(self, items: Dict[str, Optional[TNodeAsTuple]]):
         self.items = items
 
@@ -944,12 +1426,21 @@ class RawRPCResponse:
 
 
 class NodeSpiderCrawler(SpiderCrawler):
-    def _parse_rpc_results(self, responses):
+    async def _parse_rpc_results(self, coros_response: Dict[str, Optional[List[str]]]) -> List[BaseNode]:
+        # peers that did not answer are dropped; the rest widen the search
+        # with the nodes they returned
         to_remove = []
-        for node_id, node in response.items():
-            
-
+        for node_id, found in coros_response.items():
+            if found is None:
+                to_remove.append(self.nearest.index[node_id])
+                continue
+            self.nearest.push([PeerNode(key) for key in found])
+        self.nearest.remove(to_remove)
 
+        # a round that asked nobody cannot learn anything new either
+        if not coros_response or self.nearest.has_exhausted_contacts():
+            return list(self.nearest)
+        return await self.find()
 
     def find(self):
         return self._find(self.protocol.call_find_node)  
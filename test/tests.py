@@ -1,4 +1,5 @@
 import os
+import asyncio
 import sys
 import json
 import pytest
@@ -25,6 +26,16 @@ class TestBaseNode:
         assert isinstance(distance, int)
         assert distance > 0
 
+    def test_distance_tuple_orders_like_distance_to(self, generic_node):
+        source = generic_node()
+        nodes = [generic_node() for _ in range(20)]
+        nodes.append(PeerNode(key="255.255.255.255:65535"))
+
+        by_int = sorted(nodes, key=source.distance_to)
+        by_tuple = sorted(nodes, key=source.distance_tuple)
+
+        assert by_int == by_tuple
+
 
 class TestPeerNode:
     @pytest.mark.skip(reason="Not implemented")
@@ -40,6 +51,18 @@ class TestPeerNode:
 
         assert expected == node.serialize()
 
+    def test_peer_node_is_reused_per_protocol_only(self):
+        async def protocols():
+            return [KademliaProtocol(PeerNode(key=f"127.0.0.1:{p}"), CacheStorage(), KSIZE, wait=1) for p in (9000, 9001)]
+
+        first, second = asyncio.run(protocols())
+        node = first.peer_node("127.0.0.1", 8000)
+
+        assert node.key == "127.0.0.1:8000"
+        assert node.addr == ("127.0.0.1", 8000)
+        assert first.peer_node("127.0.0.1", 8000) is node
+        assert second.peer_node("127.0.0.1", 8000) is not node
+
 
 class TestCacheNode:
     def test_set_payload_sets_property_on_node(self):
@@ -95,6 +118,40 @@ class TestKbucket:
 
         assert to_remove not in k.main_set
 
+    def test_readding_known_node_moves_it_to_the_tail(self, generic_node, kbucket):
+        k = kbucket()
+        nodes = [generic_node() for _ in range(3)]
+        for n in nodes:
+            k.add_node(n)
+
+        k.add_node(nodes[0])
+
+        assert k.get_main_set() == nodes[1:] + nodes[:1]
+        assert k.head == nodes[1]
+
+    def test_depth_is_shared_prefix_of_digest_bits(self, generic_node):
+        for _ in range(20):
+            k = KBucket(0, MAX_LONG, 5)
+            for _ in range(3):
+                k.add_node(generic_node())
+            k.add_node(PeerNode(key="127.0.0.1:8000"))
+
+            bits = [bytes_to_bits(n.digest) for n in k.main_set]
+            assert k.depth() == len(shared_prefix(bits))
+
+    def test_depth_is_recomputed_after_main_set_changes(self, generic_node):
+        k = KBucket(0, MAX_LONG, 5)
+        for _ in range(3):
+            k.add_node(generic_node())
+        before = k.depth()
+
+        odd = PeerNode(key="127.0.0.1:8000")
+        k.add_node(odd)
+        assert k.depth() < before
+
+        k.remove_node(odd)
+        assert k.depth() == before
+
     def test_has_in_range_returns_True_when_bucket_has_node_in_range(self, generic_node, kbucket):
         bucket = kbucket()
         node = generic_node()
@@ -129,6 +186,26 @@ class TestRoutingTable:
 
         assert len(lonely) == 1
 
+    def test_lonely_buckets_are_reported_until_seen_again(self, routing_table, generic_node):
+        table = routing_table()
+        for _ in range(5):
+            table.add_node(generic_node())
+
+        table.buckets[0].last_seen = -3700
+        assert table.lonely_buckets() == [table.buckets[0]]
+        assert table.lonely_buckets() == [table.buckets[0]]
+
+        table.buckets[0].set_last_seen()
+        assert table.lonely_buckets() == []
+
+    def test_address_keyed_peers_fit_in_the_table(self, routing_table):
+        table = routing_table()
+        node = PeerNode(key="255.255.255.255:65535")
+
+        assert node.long_id < MAX_LONG
+        table.add_node(node)
+        assert not table.is_new_node(node)
+
     def test_add_node_properly_implements_bucket_split_functionality(self, routing_table, generic_node):
         table = routing_table()
         nodes = [generic_node() for _ in range(5)]
@@ -140,6 +217,73 @@ class TestRoutingTable:
 
 
     
+    def test_get_bucket_index_matches_bucket_ranges(self, routing_table, generic_node):
+        table = routing_table()
+        for _ in range(4):
+            table.split_bucket(0)
+
+        for _ in range(20):
+            node = generic_node()
+            expected = next(i for i, b in enumerate(table.buckets) if node.long_id < b.range[1])
+            assert table.get_bucket_index(node) == expected
+
+    def test_find_neighbors_returns_k_closest_nodes(self, routing_table, generic_node):
+        table = routing_table()
+        for _ in range(4):
+            table.split_bucket(0)
+        for _ in range(30):
+            table.add_node(generic_node())
+
+        target = generic_node()
+        in_table = [n for b in table.buckets for n in b.get_main_set()]
+        expected = sorted(in_table, key=target.distance_to)[: table.ksize]
+
+        assert table.find_neighbors(target) == expected
+
+    def test_find_neighbors_visits_each_node_once_and_skips_excluded(self, routing_table, generic_node):
+        table = routing_table()
+        for _ in range(3):
+            table.split_bucket(0)
+        for _ in range(12):
+            table.add_node(generic_node())
+
+        in_table = [n for b in table.buckets for n in b.get_main_set()]
+        excluded = in_table[0]
+        neighbors = table.find_neighbors(generic_node(), k=len(in_table), exclude=excluded)
+
+        assert len(neighbors) == len(in_table) - 1
+        assert excluded not in neighbors
+
+    def test_find_neighbors_sees_nodes_added_after_a_lookup(self, routing_table, generic_node):
+        table = routing_table()
+        target = generic_node()
+        assert table.find_neighbors(target) == []
+
+        node = generic_node()
+        table.add_node(node)
+
+        assert table.find_neighbors(target) == [node]
+
+    def test_unanswered_head_ping_promotes_replacement(self, routing_table, generic_node):
+        table = routing_table()
+        bucket = table.buckets[0]
+        nodes = [generic_node() for _ in range(KSIZE + 1)]
+        for n in nodes:
+            bucket.add_node(n)
+
+        loop = asyncio.new_event_loop()
+        answered, unanswered = loop.create_future(), loop.create_future()
+        answered.set_result(True)
+        unanswered.set_result(False)
+        loop.close()
+
+        table._evict_if_unresponsive(bucket.head, answered)
+        assert nodes[0] in bucket.main_set
+
+        table._evict_if_unresponsive(bucket.head, unanswered)
+        assert nodes[0] not in bucket.main_set
+        assert nodes[-1] in bucket.main_set
+
     @pytest.mark.skip(reason="Not finished")
     def test_remove_node_makes_bucket_remove_node(self, routing_table, generic_node):
         table = routing_table()
@@ -171,3 +315,241 @@ class TestNodeHeap:
             heap.push(nodes)
 
         
+
+    def test_push_accepts_single_node_or_iterable(self, node_heap, generic_node):
+        heap = node_heap()
+        node = generic_node()
+
+        heap.push(node)
+        heap.push(iter([node, generic_node()]))
+
+        assert len(heap.heap) == 2
+        assert node in heap
+
+    def test_push_many_keeps_nearest_first(self, generic_node):
+        source = generic_node()
+        heap = NodeHeap(source, 5)
+        nodes = [generic_node() for _ in range(20)]
+
+        heap.push(nodes[:2])
+        heap.push(nodes[2:])
+
+        expected = sorted(nodes, key=source.distance_to)[:5]
+        assert list(heap) == expected
+
+
+class TestNodeSpiderCrawler:
+    def test_find_drops_silent_peers_and_crawls_returned_nodes(self):
+        async def crawl():
+            local, answering, learned = connected_protocols(9000, 9001, 9002, wait=0.2)
+            answering.router.add_node(PeerNode(key="127.0.0.1:9002"))
+            neighbors = [PeerNode(key="127.0.0.1:9001"), PeerNode(key="127.0.0.1:9003")]
+
+            spider = NodeSpiderCrawler(local, CacheNode(key="foo"), neighbors, KSIZE, 2)
+            found = await spider.find()
+            disconnect(local, answering, learned)
+            return [n.key for n in found]
+
+        found = asyncio.run(crawl())
+
+        assert "127.0.0.1:9001" in found
+        assert "127.0.0.1:9002" in found
+        assert "127.0.0.1:9003" not in found
+
+class TestRPCContainer:
+    def test_chunk_pairs_skips_pairs_too_big_for_one_request(self):
+        big = ("big", b"x" * RPCDatagramProtocol.MAX_RPC_METHOD_SIZE)
+        small = [(f"k{i}", b"v" * 1000) for i in range(20)]
+
+        chunks = list(RPCContainer._chunk_pairs(small[:10] + [big] + small[10:]))
+
+        assert [pair for chunk in chunks for pair in chunk] == small
+        assert all(len(packb(["store_many", (chunk,)])) <= RPCDatagramProtocol.MAX_RPC_METHOD_SIZE for chunk in chunks)
+
+
+class TestServer:
+    def test_load_state_restores_server_and_its_neighbors(self, tmp_path):
+        async def roundtrip():
+            server = Server("127.0.0.1", 9300, ksize=3, alpha=1)
+            server.state = str(tmp_path / "node.state")
+            server.protocol.router.buckets[0].add_node(PeerNode(key="127.0.0.1:9301"))
+            server.save_state()
+            return Server.load_state(server.state)
+
+        loaded, neighbors = asyncio.run(roundtrip())
+
+        assert loaded.node.key == "127.0.0.1:9300"
+        assert (loaded.ksize, loaded.alpha) == (3, 1)
+        assert neighbors == [("127.0.0.1", 9301)]
+
+
+class RecordingTransport:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, addr):
+        self.sent.append((data, addr))
+
+
+class LoopbackTransport:
+    """
+    Hands each datagram straight to the protocol bound to its address, so
+    protocol instances can talk to each other without sockets
+    """
+
+    def __init__(self, network, addr):
+        self.network = network
+        self.addr = addr
+
+    def sendto(self, data, addr):
+        if addr in self.network:
+            asyncio.get_event_loop().call_soon(self.network[addr].datagram_received, data, self.addr)
+
+
+def connected_protocols(*ports, wait=1):
+    network = {}
+    for port in ports:
+        protocol = KademliaProtocol(PeerNode(key=f"127.0.0.1:{port}"), CacheStorage(), KSIZE, wait=wait)
+        protocol.connection_made(LoopbackTransport(network, ("127.0.0.1", port)))
+        network[("127.0.0.1", port)] = protocol
+    return list(network.values())
+
+
+def disconnect(*protocols):
+    for protocol in protocols:
+        protocol.connection_lost(None)
+
+
+class TestRPCDatagramProtocol:
+    def test_request_and_response_frames_are_dispatched(self):
+        async def exchange():
+            protocol = KademliaProtocol(PeerNode(key="127.0.0.1:9000"), CacheStorage(), KSIZE, wait=1)
+            protocol.connection_made(RecordingTransport())
+
+            fut = protocol.ping(("127.0.0.1", 9001))
+            await asyncio.sleep(0)
+            request, _ = protocol.transport.sent.pop()
+            assert request[:1] == REQUEST_HEADER
+
+            # answer our own request, so both header kinds go through datagram_received
+            msg_id = request[1:21]
+            protocol.datagram_received(RESPONSE_HEADER + msg_id + packb("pong"), ("127.0.0.1", 9001))
+            protocol.datagram_received(REQUEST_HEADER + os.urandom(20) + packb(["stun", []]), ("127.0.0.1", 9002))
+            await asyncio.sleep(0)
+            response, addr = protocol.transport.sent.pop()
+            protocol.connection_lost(None)
+            return await fut, response, addr
+
+        result, response, addr = asyncio.run(exchange())
+
+        assert result == (True, "pong")
+        assert response[:1] == RESPONSE_HEADER
+        assert addr == ("127.0.0.1", 9002)
+
+    def test_malformed_requests_and_failing_handlers_do_not_escape(self):
+        def fail(sender):
+            raise ValueError("boom")
+
+        async def exchange():
+            protocol = KademliaProtocol(PeerNode(key="127.0.0.1:9000"), CacheStorage(), KSIZE, wait=1)
+            protocol.connection_made(RecordingTransport())
+            protocol._rpc_dispatch["fail"] = (fail, False)
+
+            protocol.datagram_received(REQUEST_HEADER + os.urandom(20) + b"\xc1", ("127.0.0.1", 9001))
+            protocol.datagram_received(REQUEST_HEADER + os.urandom(20) + packb(["fail", []]), ("127.0.0.1", 9001))
+            protocol.datagram_received(REQUEST_HEADER + os.urandom(20) + packb(["stun", []]), ("127.0.0.1", 9001))
+            return protocol.transport.sent
+
+        sent = asyncio.run(exchange())
+
+        assert len(sent) == 1
+        assert sent[0][0][:1] == RESPONSE_HEADER
+
+    def test_malformed_response_fails_the_pending_request(self):
+        async def exchange():
+            protocol = KademliaProtocol(PeerNode(key="127.0.0.1:9000"), CacheStorage(), KSIZE, wait=1)
+            protocol.connection_made(RecordingTransport())
+
+            fut = protocol.ping(("127.0.0.1", 9001))
+            request, _ = protocol.transport.sent.pop()
+            protocol.datagram_received(RESPONSE_HEADER + request[1:21] + b"\xc1", ("127.0.0.1", 9001))
+            protocol.connection_lost(None)
+            return await fut
+
+        assert asyncio.run(exchange()) == (False, None)
+
+    def test_losing_the_connection_fails_pending_requests(self):
+        async def exchange():
+            protocol = KademliaProtocol(PeerNode(key="127.0.0.1:9000"), CacheStorage(), KSIZE, wait=1)
+            protocol.connection_made(RecordingTransport())
+
+            fut = protocol.ping(("127.0.0.1", 9001))
+            protocol.connection_lost(None)
+            assert not protocol.futures and not protocol.deadlines and protocol.sweeper is None
+            return await fut
+
+        assert asyncio.run(exchange()) == (False, None)
+
+    def test_ping_and_find_node_round_trip_between_protocols(self):
+        async def exchange():
+            local, remote = connected_protocols(9000, 9001)
+            known = PeerNode(key="127.0.0.1:9002")
+            remote.router.add_node(known)
+            peer = local.peer_node("127.0.0.1", 9001)
+
+            pinged = await local.call_ping(peer)
+            found = await local.call_find_node(peer, CacheNode(key="foo"))
+            disconnect(local, remote)
+            return pinged, found
+
+        pinged, found = asyncio.run(exchange())
+
+        assert pinged
+        assert found == ["127.0.0.1:9002"]
+
+    def test_store_many_stores_pairs_with_the_remote_peer(self):
+        pairs = [("foo", b"bar"), ("baz", b"qux")]
+
+        async def exchange():
+            local, remote = connected_protocols(9000, 9001)
+            stored = await local.call_store_many(local.peer_node("127.0.0.1", 9001), pairs)
+            disconnect(local, remote)
+            return stored, remote
+
+        stored, remote = asyncio.run(exchange())
+
+        assert stored
+        for key, value in pairs:
+            assert remote.storage.get(CacheNode(key).long_id).payload == {key: value}
+        assert not remote.router.is_new_node(PeerNode(key="127.0.0.1:9000"))
+
+    def test_new_closer_node_is_sent_the_values_it_should_hold(self):
+        us, newcomer, far = (PeerNode(key=f"127.0.0.1:{port}") for port in (9000, 9001, 9100))
+
+        def value(replicated):
+            # a value goes to the newcomer when it and we are both closer to it than `far`
+            while True:
+                node = CacheNode(key=random_string())
+                d = node.distance_to
+                if (d(newcomer) < d(far) and d(us) < d(far)) == replicated:
+                    node.set_payload({node.key: b"value"})
+                    return node
+
+        sent, kept = value(True), value(False)
+
+        async def exchange():
+            local, remote = connected_protocols(9000, 9001)
+            local.router.add_node(far)
+            local.storage.add_node(sent)
+            local.storage.add_node(kept)
+
+            local.welcome_node_if_new(local.peer_node("127.0.0.1", 9001))
+            for _ in range(5):
+                await asyncio.sleep(0)
+            disconnect(local, remote)
+            return remote
+
+        remote = asyncio.run(exchange())
+
+        assert remote.storage.get(sent.long_id).payload == sent.payload
+        assert remote.storage.get(kept.long_id) is None